@@ -4,13 +4,50 @@
 const { io } = require('socket.io-client');
 
 const MAX_ROUND = 20;
+// 选择对应的中文名称
+const CHOICE_NAMES: Record<string, string> = { cooperate: '合作', betray: '背叛' };
+// 每个对手保留的历史选择数量
+const HISTORY_LIMIT = 20;
+// 是否输出调试日志（如每回合的完整对手历史），设置环境变量 DEBUG_LOG=true 开启
+const DEBUG_LOG = process.env.DEBUG_LOG === 'true';
+
+// 固定容量的对手选择记录（环形缓冲区），写满后覆盖最早的记录，避免数组头部删除的整体移动
+class ChoiceHistory {
+  private buffer: Array<string>;
+  private start: number = 0;
+  private size: number = 0;
+
+  constructor(private capacity: number) {
+    this.buffer = new Array(capacity);
+  }
+
+  public push(choice: string): void {
+    if (this.size < this.capacity) {
+      this.buffer[(this.start + this.size) % this.capacity] = choice;
+      this.size++;
+    } else {
+      this.buffer[this.start] = choice;
+      this.start = (this.start + 1) % this.capacity;
+    }
+  }
+
+  // 按时间顺序（从早到晚）返回记录
+  public toArray(): Array<string> {
+    const result: Array<string> = [];
+    for (let i = 0; i < this.size; i++) {
+      result.push(this.buffer[(this.start + i) % this.capacity]);
+    }
+    return result;
+  }
+}
+
 class TrustPVPClient {
   private socket: any;
   private playerName: string;
   private playerId: string | null = null;
   private isInGame: boolean = false;
   // 添加对手历史记录跟踪
-  private opponentHistory: Map<string, Array<string>> = new Map();
+  private opponentHistory: Map<string, ChoiceHistory> = new Map();
   // 添加当前对手ID跟踪
   private currentOpponentId: string = '';
   private currentOpponentName: string = '';
@@ -18,6 +55,10 @@ class TrustPVPClient {
   private roundCounter: Map<string, number> = new Map();
   private maxRounds: number = MAX_ROUND;
   private currentScore: number = 20;
+  // 待执行的重新加入游戏定时器
+  private joinGameTimer: ReturnType<typeof setTimeout> | null = null;
+  // 待执行的重新加入游戏的预定时间（毫秒时间戳）
+  private joinGameDueAt: number = 0;
 
   constructor(serverUrl: string, playerName: string) {
     this.playerName = playerName;
@@ -101,7 +142,7 @@ class TrustPVPClient {
     }) => {
       this.currentScore = data.score;
       console.log(`回合结束 - 得分: ${data.score}, 总分: ${data.totalScore}`);
-      console.log(`对手 ${data.opponentName} 选择了: ${data.opponentChoice === 'cooperate' ? '合作' : '背叛'}`);
+      console.log(`对手 ${data.opponentName} 选择了: ${CHOICE_NAMES[data.opponentChoice]}`);
 
       // 使用API返回的对手ID或保存的当前对手ID
       const opponentId = data.opponent || this.currentOpponentId;
@@ -119,11 +160,7 @@ class TrustPVPClient {
       }
 
       // 短暂延迟后加入下一局游戏
-      setTimeout(() => {
-        if (this.socket.connected) {
-          this.joinGame();
-        }
-      }, 1000);
+      this.scheduleJoinGame(1000);
     });
 
     this.socket.on('gameEnd', (data: {
@@ -137,11 +174,7 @@ class TrustPVPClient {
       this.isInGame = false;
 
       // 短暂延迟后重新加入游戏
-      setTimeout(() => {
-        if (this.socket.connected) {
-          this.joinGame();
-        }
-      }, 2000);
+      this.scheduleJoinGame(2000);
     });
 
     this.socket.on('opponentDisconnected', (data: { message: string }) => {
@@ -149,11 +182,7 @@ class TrustPVPClient {
       this.isInGame = false;
 
       // 短暂延迟后重新加入游戏
-      setTimeout(() => {
-        if (this.socket.connected) {
-          this.joinGame();
-        }
-      }, 1000);
+      this.scheduleJoinGame(1000);
     });
 
     this.socket.on('error', (data: { message: string }) => {
@@ -169,6 +198,24 @@ class TrustPVPClient {
     this.socket.emit('login', loginData);
   }
 
+  // 延迟后重新加入游戏；同一时间只保留一个定时器，已有更早的计划时保持不变
+  private scheduleJoinGame(delay: number): void {
+    const dueAt = Date.now() + delay;
+    if (this.joinGameTimer) {
+      if (this.joinGameDueAt <= dueAt) {
+        return;
+      }
+      clearTimeout(this.joinGameTimer);
+    }
+    this.joinGameDueAt = dueAt;
+    this.joinGameTimer = setTimeout(() => {
+      this.joinGameTimer = null;
+      if (this.socket.connected) {
+        this.joinGame();
+      }
+    }, delay);
+  }
+
   public joinGame(): void {
     if (!this.isInGame) {
       console.log('尝试加入游戏...');
@@ -178,18 +225,18 @@ class TrustPVPClient {
 
   // 记录对手选择的历史
   private recordOpponentChoice(opponentId: string, choice: string): void {
-    if (!this.opponentHistory.has(opponentId)) {
-      this.opponentHistory.set(opponentId, []);
+    // 已有记录的对手只需一次查找
+    let history = this.opponentHistory.get(opponentId);
+    if (!history) {
+      // 只保留最近的20次选择，防止历史记录过长
+      history = new ChoiceHistory(HISTORY_LIMIT);
+      this.opponentHistory.set(opponentId, history);
     }
 
-    const history = this.opponentHistory.get(opponentId);
-    if (history) {
-      history.push(choice);
-      console.log(`对手历史记录更新 - ID: ${opponentId}, 历史: [${history.join(', ')}]`);
-      // 只保留最近的20次选择，防止历史记录过长
-      if (history.length > 20) {
-        history.shift();
-      }
+    history.push(choice);
+    // 解码并拼接完整历史开销较大，仅在调试时输出
+    if (DEBUG_LOG) {
+      console.log(`对手历史记录更新 - ID: ${opponentId}, 历史: [${history.toArray().join(', ')}]`);
     }
   }
 
@@ -230,7 +277,7 @@ class TrustPVPClient {
   }
 
   private makeChoice(choice: 'cooperate' | 'betray'): void {
-    console.log(`选择: ${choice === 'cooperate' ? '合作' : '背叛'}`);
+    console.log(`选择: ${CHOICE_NAMES[choice]}`);
     this.socket.emit('makeChoice', choice);
 
     // 注意：这里不需要增加回合计数，因为回合计数在roundComplete事件中已经处理
@@ -251,6 +298,10 @@ class TrustPVPClient {
   }
 
   public disconnect(): void {
+    if (this.joinGameTimer) {
+      clearTimeout(this.joinGameTimer);
+      this.joinGameTimer = null;
+    }
     this.socket.disconnect();
   }
 }
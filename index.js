@@ -39,12 +39,21 @@ const GAME_CONFIG = {
   ACCIDENT_RATE: 0.05 // 每回合事故概率
 };
 
+// 连接不活跃超时时间（毫秒）
+const INACTIVE_TIMEOUT = 15 * 60 * 1000;
+
+// 排行榜缓存有效期（毫秒）：每回合结束所有在线客户端都会请求排行榜，3秒内的请求共享同一次Redis全量扫描；分数写入时缓存会立即失效
+const LEADERBOARD_CACHE_TTL = 3000;
+
+// 是否输出高频调试日志（逐连接巡检、心跳包），设置环境变量 DEBUG_LOG=true 开启
+const DEBUG_LOG = process.env.DEBUG_LOG === 'true';
+
 // 游戏状态
 let gameState = {
   players: new Map(),
   waitingPlayers: new Set(),
   matches: new Map(), // 新增：存储当前对战关系
-  socketToPlayerId: new Map(), // 新增：存储socket.id到玩家ID的映射
+  playerIdToSocket: new Map(), // 玩家ID到socket.id的映射（socket对应的玩家ID保存在socket.data.playerId）
   globalRewards: {
     cooperate: -1, // 合作扣分
     betray: 3, // 欺骗得分
@@ -96,13 +105,17 @@ setInterval(() => {
   console.log('当前奖励:', gameState.globalRewards);
   // 遍历所有连接，检查它们的状态
   const sockets = io.sockets.sockets;
+  // 当前时间在整轮检查中只取一次
+  const now = Date.now();
   for (const [id, socket] of sockets) {
     // 检查最后活动时间
     // const lastActiveTime = socket.handshake.issued;
     const lastActiveTime = socket.lastActiveTime;
-    console.log('lastActiveTime:', lastActiveTime, 'id:', id);
-    const inactiveTime = Date.now() - lastActiveTime;
-    if (inactiveTime > 15 * 60 * 1000) { // 30秒无活动
+    if (DEBUG_LOG) {
+      console.log('lastActiveTime:', lastActiveTime, 'id:', id);
+    }
+    const inactiveTime = now - lastActiveTime;
+    if (inactiveTime > INACTIVE_TIMEOUT) { // 15分钟无活动
       console.log(`强制断开不活跃的连接: ${id}, 不活跃时间: ${inactiveTime / 1000}秒`);
       socket.disconnect(true);
     }
@@ -115,8 +128,8 @@ setInterval(() => {
 io.on('connection', (socket) => {
   console.log('新WebSocket连接建立:', socket.id, '传输类型:', socket.conn.transport.name);
   socket.lastActiveTime = Date.now();
-  // 设置ping/pong心跳间隔
-  if (socket.conn.transport.name === 'websocket') {
+  // 设置ping/pong心跳间隔（仅调试时监听每个数据包）
+  if (DEBUG_LOG && socket.conn.transport.name === 'websocket') {
     console.log('为WebSocket连接设置心跳检测');
     socket.conn.on('packet', (packet) => {
       if (packet.type === 'pong') {
@@ -145,12 +158,10 @@ io.on('connection', (socket) => {
       let playerData;
       let isNewPlayer = false;
 
-      // 检查是否是现有玩家
-      if (playerId && await redisClient.exists(`player:${playerId}`)) {
-        // 加载现有玩家数据
-        const redisData = await redisClient.hGetAll(`player:${playerId}`);
-
-        // 重建玩家数据
+      // 检查是否是现有玩家：直接读取哈希，键不存在时返回空对象，省去单独的EXISTS往返
+      const redisData = playerId ? await redisClient.hGetAll(`player:${playerId}`) : {};
+      if (Object.keys(redisData).length > 0) {
+        // 根据已加载的数据重建玩家数据
         playerData = {
           id: playerId,
           name: playerName, // 更新名称
@@ -179,8 +190,15 @@ io.on('connection', (socket) => {
         console.log(`新玩家注册: ${playerName} (ID: ${playerId})`);
       }
 
-      // 建立socket.id到playerId的映射
-      gameState.socketToPlayerId.set(socket.id, playerId);
+      // 同一连接切换账号时，移除旧账号的反向映射
+      const previousPlayerId = socket.data.playerId;
+      if (previousPlayerId) {
+        releasePlayerSocket(previousPlayerId, socket.id);
+      }
+
+      // 建立socket与playerId的双向映射，玩家ID直接挂在socket上，各事件处理无需再查表
+      socket.data.playerId = playerId;
+      gameState.playerIdToSocket.set(playerId, socket.id);
 
       // 存储玩家数据到内存
       gameState.players.set(playerId, playerData);
@@ -214,7 +232,7 @@ io.on('connection', (socket) => {
   socket.on('joinGame', async () => {
     try {
       // 获取玩家ID
-      const playerId = gameState.socketToPlayerId.get(socket.id);
+      const playerId = socket.data.playerId;
       if (!playerId) {
         socket.emit('error', { message: '请先登录' });
         return;
@@ -223,14 +241,13 @@ io.on('connection', (socket) => {
       // 获取玩家数据
       let player = gameState.players.get(playerId);
       if (!player) {
-        // 尝试从Redis恢复
-        const exists = await redisClient.exists(`player:${playerId}`);
-        if (!exists) {
+        // 尝试从Redis恢复，键不存在时返回空对象
+        const redisData = await redisClient.hGetAll(`player:${playerId}`);
+        if (Object.keys(redisData).length === 0) {
           socket.emit('error', { message: '玩家数据丢失，请重新登录' });
           return;
         }
 
-        const redisData = await redisClient.hGetAll(`player:${playerId}`);
         player = {
           id: playerId,
           name: redisData.name || '匿名玩家',
@@ -273,8 +290,10 @@ io.on('connection', (socket) => {
       player.currentChoice = null;
 
 
-      // 更新Redis
-      await updatePlayerRedisData(playerId, player);
+      // 更新Redis：后台写入，不阻塞后续流程（同一连接上的命令按序执行，错误在函数内部处理）
+      updatePlayerRedisData(playerId, player);
+      // 分数已重置，排行榜缓存失效
+      invalidateLeaderboardCache();
 
       // 发送游戏加入确认
       socket.emit('gameJoined', {
@@ -282,6 +301,9 @@ io.on('connection', (socket) => {
         // globalRewards: gameState.globalRewards
       });
 
+      // 同一玩家可能在多个连接登录（如多个标签页），请求被接受后以当前连接为准
+      gameState.playerIdToSocket.set(playerId, socket.id);
+
       // 添加到等待队列
       gameState.waitingPlayers.add(playerId);
       console.log(`玩家 ${player.name} (ID: ${playerId}) 加入等待队列，当前等待玩家数: ${gameState.waitingPlayers.size}`);
@@ -304,7 +326,7 @@ io.on('connection', (socket) => {
       }
 
       // 获取玩家ID
-      const playerId = gameState.socketToPlayerId.get(socket.id);
+      const playerId = socket.data.playerId;
       if (!playerId) {
         socket.emit('error', { message: '请先登录' });
         return;
@@ -322,6 +344,10 @@ io.on('connection', (socket) => {
         socket.emit('error', { message: '未找到对手' });
         return;
       }
+
+      // 同一玩家可能在多个连接登录（如多个标签页），选择被接受后以当前连接为准
+      gameState.playerIdToSocket.set(playerId, socket.id);
+
       // 检查是否发生事故,如果发生事故，选择取反
       if (Math.random() < GAME_CONFIG.ACCIDENT_RATE) {
         choice = choice === 'cooperate' ? 'betray' : 'cooperate';
@@ -338,8 +364,8 @@ io.on('connection', (socket) => {
         rewards: { ...gameState.globalRewards }
       });
 
-      // 更新Redis
-      await updatePlayerRedisData(playerId, player);
+      // 更新Redis：后台写入，不阻塞回合结算
+      updatePlayerRedisData(playerId, player);
 
       console.log(`玩家 ${player.name} (ID: ${playerId}) 选择了 ${choice}`);
 
@@ -354,7 +380,7 @@ io.on('connection', (socket) => {
   // 断开连接处理
   socket.on('disconnect', () => {
     try {
-      const playerId = gameState.socketToPlayerId.get(socket.id);
+      const playerId = socket.data.playerId;
       if (!playerId) return;
 
       console.log(`玩家 ID: ${playerId} 断开连接`);
@@ -385,18 +411,17 @@ io.on('connection', (socket) => {
       }
 
       // 清理连接相关数据
-      gameState.socketToPlayerId.delete(socket.id);
+      releasePlayerSocket(playerId, socket.id);
       gameState.waitingPlayers.delete(playerId);
       gameState.matches.delete(playerId);
 
       // 记录最后在线时间，但保留玩家数据
       const player = gameState.players.get(playerId);
       if (player) {
-        // 保存所有数据，不仅是lastSeen
-        updatePlayerRedisData(playerId, {
-          ...player,
-          lastSeen: new Date().toISOString()
-        }).catch(err => console.error('断开连接保存数据错误:', err));
+        // 保存所有数据，不仅是lastSeen；玩家随后即从内存移除，直接写在原对象上即可
+        player.lastSeen = new Date().toISOString();
+        updatePlayerRedisData(playerId, player)
+          .catch(err => console.error('断开连接保存数据错误:', err));
 
         gameState.players.delete(playerId);
       }
@@ -416,7 +441,7 @@ io.on('connection', (socket) => {
   // 获取排行榜
   socket.on('getLeaderboard', async () => {
     try {
-      const leaderboard = await getTopPlayers(50);
+      const leaderboard = await getCachedTopPlayers(50);
       socket.emit('leaderboardData', { leaderboard });
     } catch (err) {
       console.error('获取排行榜错误:', err);
@@ -427,7 +452,7 @@ io.on('connection', (socket) => {
   // 获取玩家历史数据
   socket.on('getPlayerStats', async () => {
     try {
-      const playerId = gameState.socketToPlayerId.get(socket.id);
+      const playerId = socket.data.playerId;
       if (!playerId) {
         socket.emit('error', { message: '请先登录' });
         return;
@@ -456,12 +481,23 @@ function updateGlobalRewards() {
 
 }
 
+// 连接断开或切换账号时释放玩家ID到socket的映射；
+// 同一玩家可能仍有其他在线连接（如多个标签页），此时改为指向其中一个
+function releasePlayerSocket(playerId, socketId) {
+  if (gameState.playerIdToSocket.get(playerId) !== socketId) return;
+
+  gameState.playerIdToSocket.delete(playerId);
+  for (const [id, otherSocket] of io.sockets.sockets) {
+    if (id !== socketId && otherSocket.data.playerId === playerId) {
+      gameState.playerIdToSocket.set(playerId, id);
+      return;
+    }
+  }
+}
+
 // 通过玩家ID查找Socket ID
 function findSocketByPlayerId(playerId) {
-  for (const [socketId, id] of gameState.socketToPlayerId.entries()) {
-    if (id === playerId) return socketId;
-  }
-  return null;
+  return gameState.playerIdToSocket.get(playerId) || null;
 }
 
 // 查找玩家当前对手
@@ -469,51 +505,79 @@ function findOpponent(playerId) {
   return gameState.matches.get(playerId);
 }
 
-// 获取排行榜玩家
-async function getTopPlayers(limit = 10) {
-  try {
-    // 获取所有玩家ID
-    const keys = await redisClient.keys('player:*');
-    if (!keys.length) return [];
-
-    const players = [];
-
-    // 获取每个玩家的数据
-    for (const key of keys) {
-      const playerData = await redisClient.hGetAll(key);
-      if (playerData.name && playerData.score) {
-        // 从key中提取正确的玩家ID
-        const playerId = key.replace('player:', '');
-        players.push({
-          id: playerData.id || playerId, // 优先使用存储的ID，否则使用key中的ID
-          name: playerData.name,
-          score: parseInt(playerData.score),
-          maxScore: parseInt(playerData.maxScore || '0'),
-          currentRound: parseInt(playerData.currentRound || '0'),
-          totalGames: parseInt(playerData.totalGames || '0')
-        });
+// 排行榜缓存：客户端每回合结束都会请求排行榜，
+// 缓存期内的请求（包括正在进行中的查询）共享同一次Redis扫描结果
+let leaderboardCache = { limit: 0, promise: null, expiresAt: 0 };
+
+function getCachedTopPlayers(limit = 10) {
+  const now = Date.now();
+  if (!leaderboardCache.promise || leaderboardCache.limit !== limit || now >= leaderboardCache.expiresAt) {
+    const promise = getTopPlayers(limit).catch(err => {
+      // 查询失败的结果不缓存，下一次请求重新查询
+      if (leaderboardCache.promise === promise) {
+        leaderboardCache.promise = null;
       }
+      throw err;
+    });
+    leaderboardCache = {
+      limit,
+      promise,
+      expiresAt: now + LEADERBOARD_CACHE_TTL
+    };
+  }
+  return leaderboardCache.promise;
+}
+
+// 玩家分数写入后调用，使下一次排行榜请求重新查询
+function invalidateLeaderboardCache() {
+  leaderboardCache.expiresAt = 0;
+}
+
+// 获取排行榜玩家，查询失败时抛出异常，由调用方处理
+async function getTopPlayers(limit = 10) {
+  // 获取所有玩家ID
+  const keys = await redisClient.keys('player:*');
+  if (!keys.length) return [];
+
+  const players = [];
+
+  // 同一事件循环内发出的命令会被Redis客户端自动合并为一次管道请求，
+  // 避免逐个玩家等待往返
+  const allPlayerData = await Promise.all(keys.map(key => redisClient.hGetAll(key)));
+
+  // 处理每个玩家的数据
+  keys.forEach((key, index) => {
+    const playerData = allPlayerData[index];
+    if (playerData.name && playerData.score) {
+      // 从key中提取正确的玩家ID
+      const playerId = key.replace('player:', '');
+      players.push({
+        id: playerData.id || playerId, // 优先使用存储的ID，否则使用key中的ID
+        name: playerData.name,
+        score: parseInt(playerData.score),
+        maxScore: parseInt(playerData.maxScore || '0'),
+        currentRound: parseInt(playerData.currentRound || '0'),
+        totalGames: parseInt(playerData.totalGames || '0')
+      });
     }
+  });
 
-    // 按分数排序
-    players.sort((a, b) => b.score - a.score);
+  // 按分数排序
+  players.sort((a, b) => b.score - a.score);
 
-    // 返回前N名
-    return players.slice(0, limit);
-  } catch (err) {
-    console.error('获取排行榜错误:', err);
-    return [];
-  }
+  // 返回前N名
+  return players.slice(0, limit);
 }
 
 // 获取玩家统计数据
 async function getPlayerStats(playerId) {
   try {
-    if (!await redisClient.exists(`player:${playerId}`)) {
+    // 键不存在时HGETALL返回空对象，一次往返即可判断并取回数据
+    const data = await redisClient.hGetAll(`player:${playerId}`);
+    if (Object.keys(data).length === 0) {
       return null;
     }
 
-    const data = await redisClient.hGetAll(`player:${playerId}`);
     return {
       id: data.id,
       name: data.name,
@@ -531,10 +595,11 @@ async function getPlayerStats(playerId) {
 
 // 玩家匹配逻辑
 function matchPlayers() {
-  const waitingPlayers = Array.from(gameState.waitingPlayers);
-  if (waitingPlayers.length >= 2) {
-    const player1Id = waitingPlayers[0];
-    const player2Id = waitingPlayers[1];
+  if (gameState.waitingPlayers.size >= 2) {
+    // 只需要队首两名玩家，直接从迭代器读取，避免每次匹配都复制整个等待队列
+    const waitingIterator = gameState.waitingPlayers.values();
+    const player1Id = waitingIterator.next().value;
+    const player2Id = waitingIterator.next().value;
 
     // 确保两个玩家都存在
     const player1 = gameState.players.get(player1Id);
@@ -560,8 +625,10 @@ function matchPlayers() {
     // 建立匹配关系
     gameState.matches.set(player1Id, player2Id);
     gameState.matches.set(player2Id, player1Id);
-    player1.currentRewards = { ...gameState.globalRewards };
-    player2.currentRewards = { ...gameState.globalRewards };
+    // 双方使用同一份只读的奖励快照，无需为每个玩家各复制一次
+    const currentRewards = Object.freeze({ ...gameState.globalRewards });
+    player1.currentRewards = currentRewards;
+    player2.currentRewards = currentRewards;
 
     // 重置选择
     player1.currentChoice = null;
@@ -573,17 +640,18 @@ function matchPlayers() {
 
     if (socket1Id && socket2Id) {
       // 通知玩家匹配成功
+      // history 按回合顺序追加，本身有序，直接截取最近100条即可，无需每次匹配重新排序
       io.to(socket1Id).emit('matchFound', {
         opponent: player2Id,
         opponentName: player2.name,
-        opponentHistory: player2.history.sort((a, b) => a.round - b.round).slice(-100).reverse(),
+        opponentHistory: player2.history.slice(-100).reverse(),
         currentRewards: player2.currentRewards
       });
 
       io.to(socket2Id).emit('matchFound', {
         opponent: player1Id,
         opponentName: player1.name,
-        opponentHistory: player1.history.sort((a, b) => a.round - b.round).slice(-100).reverse(),
+        opponentHistory: player1.history.slice(-100).reverse(),
         currentRewards: player1.currentRewards
       });
 
@@ -635,9 +703,11 @@ function checkMatchCompletion(player1Id, player2Id) {
     player1.currentRound++;
     player2.currentRound++;
 
-    // 更新Redis
-    updatePlayerRedisData(player1Id, player1);
-    updatePlayerRedisData(player2Id, player2);
+    // 更新Redis（本回合的history已在makeChoice时写入，这里只写入变化的字段）
+    updatePlayerRoundData(player1Id, player1);
+    updatePlayerRoundData(player2Id, player2);
+    // 分数已变化，后续排行榜请求需重新查询（写入与查询走同一连接，按序执行）
+    invalidateLeaderboardCache();
 
     // 获取socket连接
     const socket1Id = findSocketByPlayerId(player1Id);
@@ -666,9 +736,9 @@ function checkMatchCompletion(player1Id, player2Id) {
     player1.currentChoice = null;
     player2.currentChoice = null;
 
-    // 检查游戏是否结束
-    const player1Ended = checkGameEnd(player1Id);
-    const player2Ended = checkGameEnd(player2Id);
+    // 检查游戏是否结束（复用上面已取得的玩家数据和socket连接）
+    const player1Ended = checkGameEnd(player1Id, player1, socket1Id);
+    const player2Ended = checkGameEnd(player2Id, player2, socket2Id);
 
     // 处理匹配关系
     gameState.matches.delete(player1Id);
@@ -696,7 +766,7 @@ async function updatePlayerRedisData(playerId, player) {
       return;
     }
 
-    await redisClient.hSet(`player:${playerId}`, {
+    const fields = {
       'id': player.id || playerId,
       'name': player.name || '匿名玩家',
       'score': String(player.score || GAME_CONFIG.INITIAL_SCORE),
@@ -705,38 +775,55 @@ async function updatePlayerRedisData(playerId, player) {
       'currentChoice': player.currentChoice || '',
       'totalGames': String(player.totalGames || 0),
       'lastUpdated': new Date().toISOString()
+    };
+    if (player.lastSeen) {
+      fields.lastSeen = player.lastSeen;
+    }
+
+    await redisClient.hSet(`player:${playerId}`, fields);
+  } catch (err) {
+    console.error(`更新Redis数据错误 (${playerId}):`, err);
+  }
+}
+
+// 回合结算后只更新分数和轮次，避免重复序列化整个history
+async function updatePlayerRoundData(playerId, player) {
+  try {
+    await redisClient.hSet(`player:${playerId}`, {
+      'score': String(player.score),
+      'currentRound': String(player.currentRound),
+      'lastUpdated': new Date().toISOString()
     });
   } catch (err) {
     console.error(`更新Redis数据错误 (${playerId}):`, err);
   }
 }
 
+// 选择对应的编号，用于查表计算得分
+const CHOICE_INDEX = { cooperate: 0, betray: 1 };
+
+// 得分表：按 CHOICE_INDEX[choice1] * 2 + CHOICE_INDEX[choice2] 索引，
+// 每项为 [玩家1对应的奖励项, 玩家2对应的奖励项]
+const SCORE_TABLE = [
+  ['bothCooperate', 'bothCooperate'], // 合作 vs 合作
+  ['cooperate', 'betray'],            // 合作 vs 欺骗
+  ['betray', 'cooperate'],            // 欺骗 vs 合作
+  ['bothBetray', 'bothBetray']        // 欺骗 vs 欺骗
+];
+
 // 计算得分
 function calculateScores(choice1, choice2, currentRewards) {
-  const { bothCooperate, bothBetray, cooperate, betray } = currentRewards;
-
-  if (choice1 === 'cooperate' && choice2 === 'cooperate') {
-    return { player1: bothCooperate, player2: bothCooperate };
-  } else if (choice1 === 'betray' && choice2 === 'betray') {
-    return { player1: bothBetray, player2: bothBetray };
-  } else if (choice1 === 'cooperate' && choice2 === 'betray') {
-    return { player1: cooperate, player2: betray };
-  } else {
-    return { player1: betray, player2: cooperate };
-  }
+  const [reward1, reward2] = SCORE_TABLE[CHOICE_INDEX[choice1] * 2 + CHOICE_INDEX[choice2]];
+  return { player1: currentRewards[reward1], player2: currentRewards[reward2] };
 }
 
-// 检查游戏是否结束
-function checkGameEnd(playerId) {
-  const player = gameState.players.get(playerId);
+// 检查游戏是否结束，player 和 socketId 由调用方传入，避免重复查找
+function checkGameEnd(playerId, player, socketId) {
   if (!player) return true;
 
   if (player.score <= GAME_CONFIG.MIN_SCORE ||
     player.currentRound >= GAME_CONFIG.MAX_ROUNDS) {
 
-    // 获取socket连接
-    const socketId = findSocketByPlayerId(playerId);
-
     if (socketId) {
       // 通知玩家游戏结束
       io.to(socketId).emit('gameEnd', {
@@ -755,6 +842,7 @@ function checkGameEnd(playerId) {
 
     // 最终分数保持不变，确保保存到Redis
     updatePlayerRedisData(playerId, player);
+    invalidateLeaderboardCache();
 
     // 清理匹配状态
     gameState.waitingPlayers.delete(playerId);